@@ -1,12 +1,13 @@
 #!/usr/bin/env python3
 
 from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
 import datetime
 import os
 from pathlib import Path
-import shutil
 import signal
 import sys
+import time
 
 import lkt.report
 import lkt.source
@@ -24,6 +25,9 @@ import lkt.riscv
 import lkt.s390
 import lkt.x86_64
 
+# Do not try to update boot-utils if it was updated within this many seconds
+BOOT_UTILS_UPDATE_INTERVAL = 60 * 60
+
 # This is the minimum version of Linux that can be used with this test
 # framework due to assumptions made throughout the framework with regards to
 # present commits and make variables.
@@ -73,6 +77,9 @@ def parse_arguments():
     parser.add_argument('--boot-utils-folder',
                         type=str,
                         help='Path to boot-utils folder (default: vendored boot-utils).')
+    parser.add_argument('--force-update-boot-utils',
+                        action='store_true',
+                        help='Update vendored boot-utils even if it was updated recently.')
     parser.add_argument('-l',
                         '--linux-folder',
                         required=True,
@@ -92,7 +99,9 @@ def parse_arguments():
         'Only build configs that can be booted in QEMU and only build kernel images (no modules)')
     parser.add_argument('--save-objects',
                         action='store_true',
-                        help='Save object files (default: Remove build folder).')
+                        help=('Save object files in <build folder>/<ARCH>/<N>, one folder per '
+                              'configuration in the order they are built; the O= value in each '
+                              'log shows its folder (default: Remove build folder).'))
     parser.add_argument('-t',
                         '--targets-to-build',
                         choices=SUPPORTED_TARGETS,
@@ -134,19 +143,6 @@ if __name__ == '__main__':
         raise FileNotFoundError(f"Supplied Linux source folder ('{args.linux_folder}') not found?")
     lsm = lkt.source.LinuxSourceManager(linux_folder)
 
-    if args.boot_utils_folder:
-        boot_utils_folder = Path(args.boot_utils_folder).resolve()
-    else:
-        lkt.utils.header('Updating boot-utils')
-        if not (boot_utils_folder := Path(REPO, 'src/boot-utils')).exists():
-            lkt.utils.run([
-                'git',
-                'clone',
-                'https://github.com/ClangBuiltLinux/boot-utils',
-                boot_utils_folder,
-            ])
-        lkt.utils.run(['git', 'pull', '--no-edit'], cwd=boot_utils_folder)
-
     if args.build_folder:
         build_folder = Path(args.build_folder).resolve()
     else:
@@ -166,7 +162,33 @@ if __name__ == '__main__':
         boot_utils_json,
         'https://api.github.com/repos/ClangBuiltLinux/boot-utils/releases/latest',
     ]
-    if not (lkt.utils.run_check_rc_zero(boot_utils_json_cmd) or boot_utils_json.exists()):
+    # Download the boot-utils release information while boot-utils itself is
+    # being updated, as both just wait on the network.
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        boot_utils_json_future = executor.submit(lkt.utils.run_check_rc_zero, boot_utils_json_cmd)
+
+        if args.boot_utils_folder:
+            boot_utils_folder = Path(args.boot_utils_folder).resolve()
+        else:
+            lkt.utils.header('Updating boot-utils')
+            if not (boot_utils_folder := Path(REPO, 'src/boot-utils')).exists():
+                # Only the latest version of boot-utils is needed
+                lkt.utils.run([
+                    'git',
+                    'clone',
+                    '--depth=1',
+                    '--single-branch',
+                    'https://github.com/ClangBuiltLinux/boot-utils',
+                    boot_utils_folder,
+                ])
+            # Avoid hitting the network on every invocation if boot-utils has
+            # been updated recently.
+            elif args.force_update_boot_utils or not (
+                (fetch_head := Path(boot_utils_folder, '.git/FETCH_HEAD')).exists()
+                    and time.time() - fetch_head.stat().st_mtime < BOOT_UTILS_UPDATE_INTERVAL):
+                lkt.utils.run(['git', 'pull', '--no-edit', '--no-tags'], cwd=boot_utils_folder)
+
+    if not (boot_utils_json_future.result() or boot_utils_json.exists()):
         raise FileNotFoundError(
             f"{boot_utils_json} failed to download and a previous copy is not available!")
 
@@ -176,9 +198,12 @@ if __name__ == '__main__':
     for item in prefixes:
         if not item:
             continue
-        if not (prefix := Path(item)).exists():
-            raise FileNotFoundError(f"Supplied prefix ('{prefix}') does not exist?")
+        prefix = Path(item)
+        # The bin folder existing implies the prefix exists, so only check the
+        # prefix to provide a better error message.
         if not (bin_folder := Path(prefix, 'bin')).exists():
+            if not prefix.exists():
+                raise FileNotFoundError(f"Supplied prefix ('{prefix}') does not exist?")
             raise FileNotFoundError(f"Supplied prefix ('{prefix}') has no 'bin' folder?")
         if (bin_folder := str(bin_folder)) not in path:
             path.insert(0, bin_folder)
@@ -208,12 +233,21 @@ if __name__ == '__main__':
 
     if len(results) == 0:
         make_vars = {}
-        if args.use_ccache and shutil.which('ccache'):
+        if args.use_ccache and lkt.utils.which('ccache'):
             make_vars['CC'] = 'ccache clang'
             make_vars['HOSTCC'] = 'ccache clang'
-        if shutil.which('pbzip2'):
+            # Build folders are recreated whenever the configuration changes
+            # and generated headers are rewritten with new timestamps, so hash
+            # the dependency files generated by the compiler rather than
+            # running the preprocessor and do not miss on header timestamps.
+            # Values already in the environment win and the cache location is
+            # left to the user's ccache configuration.
+            os.environ.setdefault('CCACHE_DEPEND', 'true')
+            os.environ.setdefault('CCACHE_SLOPPINESS',
+                                  'include_file_ctime,include_file_mtime,time_macros')
+        if lkt.utils.which('pbzip2'):
             make_vars['KBZIP2'] = 'pbzip2'
-        if shutil.which('pigz'):
+        if lkt.utils.which('pigz'):
             make_vars['KGZIP'] = 'pigz'
 
         lkt_runners = {
@@ -243,3 +277,6 @@ if __name__ == '__main__':
             results += runner.run()
 
     report.generate_report(results)
+
+    # Do not leave the build folders behind, which can be rather large
+    lkt.utils.wait_for_folder_removals()
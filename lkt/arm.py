@@ -2,9 +2,9 @@
 
 from pathlib import Path
 import re
-import shutil
 
 import lkt.runner
+import lkt.utils
 from lkt.version import ClangVersion, LinuxVersion
 
 KERNEL_ARCH = 'arm'
@@ -115,7 +115,7 @@ class ArmLKTRunner(lkt.runner.LKTRunner):
 
     def run(self):
         for cross_compile in ('arm-linux-gnu-', 'arm-linux-gnueabihf-', f"{CLANG_TARGET}-"):
-            if shutil.which(f"{cross_compile}as"):
+            if lkt.utils.which(f"{cross_compile}as"):
                 break
 
         if '6f5b41a2f5a63' not in self.lsm.commits:
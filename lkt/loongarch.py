@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 
+import functools
 from pathlib import Path
 
 import lkt.runner
@@ -38,7 +39,11 @@ class LoongArchLKTRunner(lkt.runner.LKTRunner):
         super().__init__(KERNEL_ARCH, CLANG_TARGET)
 
         self._broken_configs = []
-        self._qemu_version = QemuVersion(arch=QEMU_ARCH)
+
+    # Only run the tool when it is actually needed, as run() may bail out early
+    @functools.cached_property
+    def _qemu_version(self):
+        return QemuVersion(arch=QEMU_ARCH)
 
     def _add_defconfig_runners(self):
         runner = LoongArchLLVMKernelRunner()
@@ -1,8 +1,7 @@
 #!/usr/bin/env python3
 
-import shutil
-
 import lkt.runner
+import lkt.utils
 from lkt.version import LinuxVersion
 
 KERNEL_ARCH = 'mips'
@@ -31,7 +30,7 @@ class MipsLKTRunner(lkt.runner.LKTRunner):
         super().__init__(KERNEL_ARCH, CLANG_TARGET)
 
         for cross_compile in ('mips64-linux-gnu-', f"{CLANG_TARGET}-", 'mipsel-linux-gnu-'):
-            if shutil.which(f"{cross_compile}as"):
+            if lkt.utils.which(f"{cross_compile}as"):
                 self._cross_compile = cross_compile
 
         self._be_vars = {}
@@ -1,7 +1,6 @@
 #!/usr/bin/env python3
 
 from pathlib import Path
-import shutil
 
 import lkt.runner
 import lkt.utils
@@ -60,7 +59,7 @@ class PowerPCLKTRunner(lkt.runner.LKTRunner):
             # self.make_vars. If binutils are not installed, the whole build
             # will be skipped later.
             self.make_vars['CROSS_COMPILE'] = cross_compile
-            if shutil.which(f"{cross_compile}as"):
+            if lkt.utils.which(f"{cross_compile}as"):
                 break
 
         self._ppc64_vars = {}
@@ -1,5 +1,7 @@
 #!/usr/bin/env python3
 
+from concurrent.futures import ThreadPoolExecutor
+import mmap
 import os
 from pathlib import Path
 import platform
@@ -10,13 +12,38 @@ import time
 import lkt.runner
 import lkt.utils
 
+LOG_ISSUE_RE = re.compile(rb"error:|warning:|undefined")
+
 
 def get_cmd_info(cmd):
     version = lkt.utils.chronic([cmd, '--version']).stdout.splitlines()[0]
-    location = Path(shutil.which(cmd)).parent
+    location = Path(lkt.utils.which(cmd)).parent
     return version, location
 
 
+def get_log_issues(log, linux):
+    # Search the raw log for the interesting strings and only extract and
+    # decode the lines that contain them, rather than decoding the whole log
+    # and searching it line by line. The log is mapped rather than read, so
+    # large logs are not copied into memory.
+    source_prefix = f"{linux}/".encode()
+    issues = []
+    with log.open('rb') as file:
+        # mmap() cannot map an empty file
+        if os.fstat(file.fileno()).st_size == 0:
+            return issues
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as log_data:
+            pos = 0
+            while match := LOG_ISSUE_RE.search(log_data, pos):
+                start = log_data.rfind(b'\n', 0, match.start()) + 1
+                if (end := log_data.find(b'\n', match.end())) == -1:
+                    end = len(log_data)
+                line = log_data[start:end].rstrip(b'\r').replace(source_prefix, b'')
+                issues.append(line.decode('utf-8', errors='replace'))
+                pos = end + 1
+    return issues
+
+
 def get_linux_version(linux):
     (include_config := Path(linux, 'include/config')).mkdir(exist_ok=True, parents=True)
     Path(include_config, 'auto.conf').write_text('CONFIG_LOCALVERSION_AUTO=y\n', encoding='utf-8')
@@ -57,9 +84,16 @@ class LKTReport:
 
         uname = platform.uname()
 
-        self.env_info['clang version'], self.env_info['clang location'] = get_cmd_info('clang')
-        self.env_info['binutils version'], self.env_info['binutils location'] = get_cmd_info('as')
-        self.env_info['Linux source version'] = get_linux_version(self.folders.source)
+        # These all wait on subprocesses and are independent, so run them at
+        # the same time.
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            clang_info = executor.submit(get_cmd_info, 'clang')
+            as_info = executor.submit(get_cmd_info, 'as')
+            linux_version = executor.submit(get_linux_version, self.folders.source)
+
+        self.env_info['clang version'], self.env_info['clang location'] = clang_info.result()
+        self.env_info['binutils version'], self.env_info['binutils location'] = as_info.result()
+        self.env_info['Linux source version'] = linux_version.result()
         self.env_info['Linux source location'] = self.folders.source
         self.env_info['Host uname'] = f"{uname.system} {uname.node} {uname.release} {uname.version} {uname.machine}"  # yapf: disable
         self.env_info['PATH'] = os.environ['PATH']
@@ -75,10 +109,7 @@ class LKTReport:
             kernel_result.append(' '.join(kernel))
 
             if result['build'] == 'failed':
-                issues = []
-                for line in result['log'].read_text(encoding='utf-8').splitlines():
-                    if re.search('error:|warning:|undefined', line):
-                        issues.append(line.replace(f"{self.folders.source}/", ''))
+                issues = get_log_issues(result['log'], self.folders.source)
                 if issues:
                     kernel_result.append('\n'.join(issues))
 
@@ -1,7 +1,8 @@
 #!/usr/bin/env python3
 
+from concurrent.futures import ThreadPoolExecutor
+import functools
 from pathlib import Path
-import shutil
 
 import lkt.runner
 import lkt.utils
@@ -44,8 +45,14 @@ class S390LKTRunner(lkt.runner.LKTRunner):
     def __init__(self):
         super().__init__(KERNEL_ARCH, CLANG_TARGET)
 
-        self._binutils_version = BinutilsVersion(binary=f"{CROSS_COMPILE}as")
-        self._qemu_version = QemuVersion(arch=QEMU_ARCH)
+    # Only run the tools when they are actually needed, as run() may bail out early
+    @functools.cached_property
+    def _binutils_version(self):
+        return BinutilsVersion(binary=f"{CROSS_COMPILE}as")
+
+    @functools.cached_property
+    def _qemu_version(self):
+        return QemuVersion(arch=QEMU_ARCH)
 
     def _add_defconfig_runners(self):
         runner = S390LLVMKernelRunner()
@@ -112,7 +119,23 @@ class S390LKTRunner(lkt.runner.LKTRunner):
 
         gnu_vars = []
         # https://github.com/llvm/llvm-project/pull/75643
-        lld_res = lkt.utils.chronic([shutil.which('ld.lld'), '-m', 'elf64_s390'], check=False)
+        lld_cmd = [lkt.utils.which('ld.lld'), '-m', 'elf64_s390']
+        # https://github.com/llvm/llvm-project/pull/81841
+        objcopy_cmd = [
+            lkt.utils.which('llvm-objcopy'),
+            '-I',
+            'binary',
+            '-O',
+            'elf64-s390',
+            '-',
+            '/dev/null',
+        ]
+        # These probes do not depend on each other, so run them at the same time
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            lld_future = executor.submit(lkt.utils.chronic, lld_cmd, check=False)
+            objcopy_future = executor.submit(lkt.utils.chronic, objcopy_cmd, check=False, input='')
+        lld_res = lld_future.result()
+        objcopy_res = objcopy_future.result()
         no_s390_support_in_lld = 'error: unknown emulation:' in lld_res.stderr
         # https://lore.kernel.org/20240207-s390-lld-and-orphan-warn-v1-11-8a665b3346ab@kernel.org/
         s390_makefile_txt = Path(self.folders.source,
@@ -120,11 +143,6 @@ class S390LKTRunner(lkt.runner.LKTRunner):
         no_s390_kernel_support_for_lld = '-z notext' not in s390_makefile_txt
         if no_s390_support_in_lld or no_s390_kernel_support_for_lld:
             gnu_vars.append('LD')
-        # https://github.com/llvm/llvm-project/pull/81841
-        objcopy_res = lkt.utils.chronic(
-            [shutil.which('llvm-objcopy'), '-I', 'binary', '-O', 'elf64-s390', '-', '/dev/null'],
-            check=False,
-            input='')
         no_s390_support_in_llvm_objcopy = 'error: invalid output format:' in objcopy_res.stderr
         # https://github.com/ClangBuiltLinux/linux/issues/1996
         s390_boot_makefile_txt = ''
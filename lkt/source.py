@@ -1,10 +1,14 @@
 #!/usr/bin/env python3
 
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import re
 
+import lkt.utils
 from lkt.version import LinuxVersion, MinToolVersion
 
+REGEX_METACHARS = re.compile(rb"[.^$*+?{}\[\]|()\\]")
+
 
 class LinuxSourceManager:
 
@@ -12,12 +16,15 @@ class LinuxSourceManager:
         # Perform same check as Linux for clean source tree to catch early failures
         if (Path(linux_source, '.config').is_file()
                 or Path(linux_source, 'include/config').is_dir()
-                or list(linux_source.glob('arch/*/include/generated'))):
+                or any(linux_source.glob('arch/*/include/generated'))):
             raise RuntimeError(f"Supplied Linux source ('{linux_source}') is not clean!")
 
-        self.commits = []
+        self.commits = set()
         self.configs = []
         self.folder = linux_source
+        self._file_cache = {}
+        self._file_checks = []
+        self.llvm_ias_defaults_on = False
 
         self.version = LinuxVersion(folder=linux_source)
 
@@ -75,20 +82,23 @@ class LinuxSourceManager:
         # Commit: Makefile: move initial clang flag handling into scripts/Makefile.clang
         # Link: https://git.kernel.org/linus/6f5b41a2f5a6314614e286274eb8e985248aac60
         # First appeared: v5.15-rc1~98^2~34
-        if Path(self.folder, 'scripts/Makefile.clang').exists():
-            self.commits.append('6f5b41a2f5a63')
+        if (makefile_clang := Path(self.folder, 'scripts/Makefile.clang')).exists():
+            self.commits.add('6f5b41a2f5a63')
+            # LLVM_IAS=1 is the default when only LLVM_IAS=0 is special cased
+            self.llvm_ias_defaults_on = lkt.utils.file_contains(makefile_clang,
+                                                                b'ifeq ($(LLVM_IAS),0)')
 
         # Commit: MIPS: VDSO: Move disabling the VDSO logic to Kconfig
         # Link: https://git.kernel.org/linus/e91946d6d93ef6167bd3b1456f163d1585095ea1
         # First appeared: v5.8-rc1~173^2~72
         if Path(self.folder, 'arch/mips/vdso/Kconfig').exists():
-            self.commits.append('e91946d6d93ef')
+            self.commits.add('e91946d6d93ef')
 
         # Commit: Hexagon: add target builtins to kernel
         # Link: https://git.kernel.org/linus/f1f99adf05f2138ff2646d756d4674e302e8d02d
         # First appeared: v5.13-rc1~37^2
         if Path(self.folder, 'arch/hexagon/lib/divsi3.S').exists():
-            self.commits.append('f1f99adf05f21')
+            self.commits.add('f1f99adf05f21')
 
         # Commit: powerpc: Add "-z notext" flag to disable diagnostic
         # Link: https://git.kernel.org/linus/0355785313e2191be4e1108cdbda94ddb0238c48
@@ -200,10 +210,9 @@ class LinuxSourceManager:
         # Introduced by: powerpc/pmac/smp: Avoid unused-variable warnings
         # Link: https://git.kernel.org/linus/9451c79bc39e610882bdd12370f01af5004a3c4f
         # First appeared: v5.7-rc1~81^2~107
-        smp_c_txt = Path(self.folder,
-                         'arch/powerpc/platforms/powermac/smp.c').read_text(encoding='utf-8')
-        if not re.search('^volatile static long int core99_l2_cache;$', smp_c_txt, flags=re.M):
-            self.commits.append('9451c79bc39e')
+        smp_c_data = self._read_file('arch/powerpc/platforms/powermac/smp.c')
+        if not re.search(b'^volatile static long int core99_l2_cache;$', smp_c_data, flags=re.M):
+            self.commits.add('9451c79bc39e')
 
         # Commit: ARM: 9122/1: select HAVE_FUTEX_CMPXCHG
         # Link: https://git.kernel.org/linus/9d417cbe36eee7afdd85c2e871685f8dab7c2dba
@@ -240,9 +249,9 @@ class LinuxSourceManager:
         # Commit: bpf: Drop libbpf, libelf, libz dependency from bpf preload.
         # Link: https://git.kernel.org/linus/e96f2d64c812d9c20adea38a9b5e08feaa21fcf5
         # First appeared: v5.18-rc1~136^2~392^2~36
-        if (preload_make := Path(self.folder, 'kernel/bpf/preload/Makefile')
-            ).exists() and 'LIBBPF_OUT' not in preload_make.read_text(encoding='utf-8'):
-            self.commits.append('e96f2d64c812d')
+        if (preload_make_data := self._read_file('kernel/bpf/preload/Makefile')
+            ) is not None and b'LIBBPF_OUT' not in preload_make_data:
+            self.commits.add('e96f2d64c812d')
 
         # Commit: riscv: Use -mno-relax when using lld linker
         # Link: https://git.kernel.org/linus/ec3a5cb61146c91f0f7dcec8b7e7157a4879a9ee
@@ -263,24 +272,56 @@ class LinuxSourceManager:
         # Commit: s390/bitops: remove small optimization to fix clang build
         # Link: https://git.kernel.org/linus/efe5e0fea4b24872736c62a0bcfc3f99bebd2005
         # First appeared: v5.12-rc1-dontuse~138^2~63
-        text = Path(self.folder, 'arch/s390/include/asm/bitops.h').read_text(encoding='utf-8')
-        if not re.search('"(o|n|x)i\t%0,%b1\\\\n"', text):
-            self.commits.append('efe5e0fea4b24')
+        bitops_data = self._read_file('arch/s390/include/asm/bitops.h')
+        if not re.search(b'"(o|n|x)i\t%0,%b1\\\\n"', bitops_data):
+            self.commits.add('efe5e0fea4b24')
+
+        self._run_file_checks()
+        # The file contents are only needed for the checks above
+        self._file_cache.clear()
 
     def _add_commit(self, commit, regex, file_path):
-        if not (file := Path(self.folder, file_path)).exists():
-            return
-        file_text = file.read_text(encoding='utf-8')
-        if re.search(regex, file_text):
-            self.commits.append(commit)
+        self._file_checks.append((self._check_commit, commit, regex.encode(), file_path))
 
     def _add_config(self, config, file_path):
-        if not (file := Path(self.folder, file_path)).exists():
-            return
-        definition = config.replace('CONFIG_', 'config ')
-        file_text = file.read_text(encoding='utf-8')
-        if definition in file_text:
+        definition = config.replace('CONFIG_', 'config ').encode()
+        self._file_checks.append((self._check_config, config, definition, file_path))
+
+    def _check_commit(self, commit, regex, file_data):
+        # Plain strings do not need to go through the regular expression engine
+        if REGEX_METACHARS.search(regex):
+            found = re.search(regex, file_data)
+        else:
+            found = regex in file_data
+        if found:
+            self.commits.add(commit)
+
+    def _check_config(self, config, definition, file_data):
+        if definition in file_data:
             self.configs.append(config)
 
+    def _read_file(self, file_path):
+        # Several files are checked more than once, so only read them once.
+        # All of the checks are for ASCII strings, so skip decoding the files.
+        if file_path not in self._file_cache:
+            try:
+                file_data = Path(self.folder, file_path).read_bytes()
+            except FileNotFoundError:
+                file_data = None
+            self._file_cache[file_path] = file_data
+        return self._file_cache[file_path]
+
+    def _run_file_checks(self):
+        # The checks are independent of each other, so read all of the files
+        # in parallel to overlap I/O latency (especially with a cold page
+        # cache) then run the checks in the order they were requested.
+        file_paths = dict.fromkeys(check[-1] for check in self._file_checks)
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(self._read_file, file_paths))
+        for check, item, pattern, file_path in self._file_checks:
+            if (file_data := self._file_cache[file_path]) is not None:
+                check(item, pattern, file_data)
+        self._file_checks.clear()
+
     def get_min_llvm_ver(self, arch=None):
         return MinToolVersion(folder=self.folder, arch=arch, tool='llvm')
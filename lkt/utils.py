@@ -1,45 +1,130 @@
 #!/usr/bin/env python3
 
-import copy
+import functools
+import mmap
 import os
 from pathlib import Path
+import re
 import shlex
+import shutil
+import stat
 import subprocess
+import threading
 import time
+import uuid
+
+FOLDER_REMOVAL_THREADS = []
+STALE_FOLDER_RUN_ID = uuid.uuid4().hex
+UNSET_CONFIG_VALS = frozenset(('', 'n', 'undef'))
 
 
 def chronic(*args, **kwargs):
-    kwargs.setdefault('capture_output', True)
+    # Callers that do not need the output can redirect stdout themselves, in
+    # which case only stderr is kept for error reporting.
+    if 'stdout' in kwargs:
+        kwargs.setdefault('stderr', subprocess.PIPE)
+    else:
+        kwargs.setdefault('capture_output', True)
+    # These are short lived helper commands that do not need any input and
+    # file descriptors created by Python are not inheritable, so skip closing
+    # every possible descriptor in the child.
+    kwargs.setdefault('close_fds', False)
+    if 'input' not in kwargs:
+        kwargs.setdefault('stdin', subprocess.DEVNULL)
 
     return run(*args, **kwargs)
 
 
+@functools.lru_cache(maxsize=None)
 def clang_supports_target(target):
+    # Only the exit code matters, so do not capture any output
     return run_check_rc_zero(
-        ['clang', f"--target={target}", '-c', '-x', 'c', '-o', '/dev/null', '/dev/null'])
+        ['clang', f"--target={target}", '-c', '-x', 'c', '-o', '/dev/null', '/dev/null'],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL)
 
 
 def cmd_str(cmd):
     if isinstance(cmd, (str, os.PathLike)):
         cmd_to_print = cmd
     else:
-        cmd_to_print = ' '.join(shlex.quote(str(elem)) for elem in cmd)
+        cmd_to_print = ' '.join([shlex.quote(str(elem)) for elem in cmd])
     return f"$ {cmd_to_print}"
 
 
-def get_config_val(linux, path, config):
-    config_file = path if path.is_file() else Path(path, '.config')
-    if not path.exists():
-        raise FileNotFoundError('Could not find configuration?')
-    scripts_config_cmd = [
-        Path(linux, 'scripts/config'),
-        '--file',
-        config_file,
-        '-k',
-        '-s',
-        config,
-    ]
-    return chronic(scripts_config_cmd).stdout.strip()
+def file_contains(path, needle):
+    """
+    Checks if a file contains a byte string without reading it into memory.
+    Parameters:
+        path (Path): Path to file to search.
+        needle (bytes): String to search for.
+    Returns:
+        True if the file contains needle, False if not.
+    """
+    with Path(path).open('rb') as file:
+        # mmap() cannot map an empty file
+        if os.fstat(file.fileno()).st_size == 0:
+            return False
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped_file:
+            return mapped_file.find(needle) != -1
+
+
+def find_tristate_symbols(linux, syms_and_files):
+    """
+    Searches Kconfig files for symbols defined as tristate in one batch.
+    Parameters:
+        linux (Path): Path to Linux source.
+        syms_and_files (list): List of (symbol, Kconfig file relative to linux) tuples.
+    Returns:
+        A set of the (symbol, Kconfig file) tuples whose symbol is tristate in that file.
+    """
+    regex = rf"config\s+({'|'.join(sym for sym, _ in syms_and_files)})\s+tristate"
+    files = sorted({file for _, file in syms_and_files})
+    if which('rg'):
+        # Each line of a match is printed as 'file\0line\n'
+        cmd = [
+            'rg',
+            '--no-config',
+            '--multiline',
+            '--with-filename',
+            '--null',
+            '--only-matching',
+            '--no-messages',
+        ]
+    else:
+        # Each match is printed as 'file\0match\0'
+        cmd = [
+            'grep',
+            '--with-filename',
+            '--null',
+            '--null-data',
+            '--only-matching',
+            '--no-messages',
+            '--extended-regexp',
+        ]
+    output = chronic([*cmd, '-e', regex, *files], check=False, cwd=linux).stdout
+
+    matches = re.finditer(r"([^\0\n]+)\0config\s+(\S+)", output)
+    return {(match.group(2), match.group(1)) for match in matches}
+
+
+def get_config_val(linux, path, config):  # noqa: ARG001
+    # Stat the path once to see if it exists and whether it is a file or a
+    # build folder, rather than separate is_file() and exists() calls.
+    try:
+        config_stat = path.stat()
+    except FileNotFoundError:
+        raise FileNotFoundError('Could not find configuration?') from None
+    if stat.S_ISREG(config_stat.st_mode):
+        config_file = path
+    else:
+        config_file = Path(path, '.config')
+        config_stat = config_file.stat()
+    # Equivalent to 'scripts/config --file <config_file> -k -s <config>' but
+    # each configuration is only parsed once, rather than running a shell
+    # script for every symbol queried.
+    config_syms = read_config_syms(config_file, config_stat.st_mtime_ns)
+    return config_syms.get(f"CONFIG_{config}", 'undef')
 
 
 def is_modular(*args):
@@ -47,7 +132,27 @@ def is_modular(*args):
 
 
 def is_set(*args):
-    return get_config_val(*args) not in ('', 'n', 'undef')
+    return get_config_val(*args) not in UNSET_CONFIG_VALS
+
+
+def get_cpu_count():
+    # Respect CPU affinity (such as cpusets in containers) when it is available
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count()
+
+
+def get_make_jobs():
+    if jobs := os.environ.get('LKT_MAKE_JOBS'):
+        return int(jobs)
+    # Some portions of the build wait on I/O, so oversubscribe the CPUs a
+    # little to keep them busy. The load average limit from
+    # get_make_load_limit() keeps this from getting out of hand.
+    return max(1, int(get_cpu_count() * 1.5))
+
+
+def get_make_load_limit():
+    return get_cpu_count() * 2
 
 
 def get_time_diff(start_time, end_time=None):
@@ -76,10 +181,90 @@ def header(hdr_str, end='\n'):
     Parameters:
         hdr_str (str): String to print inside the header.
     """
-    border = ''.join(['=' for _x in range(len(hdr_str) + 6)])
+    border = '=' * (len(hdr_str) + 6)
     print(f"\n\033[1m{border}\n== {hdr_str} ==\n{border}\n\033[0m", end=end, flush=True)
 
 
+def parse_config_line(line):
+    """
+    Parses a line from a configuration file.
+    Parameters:
+        line (str): Line to parse.
+    Returns:
+        A tuple of the symbol (including 'CONFIG_') and its value ('n' for
+        '# CONFIG_FOO is not set') or (None, None) if there is no symbol.
+        String values are unquoted, like 'scripts/config -s' does.
+    """
+    if line.startswith('CONFIG_') and '=' in line:
+        sym, val = line.split('=', 1)
+        if val.startswith('"'):
+            val = val[1:]
+        if val.endswith('"'):
+            val = val[:-1]
+        return sym, val.replace('\\"', '"')
+    if line.startswith('# CONFIG_') and line.endswith(' is not set'):
+        return line[len('# '):-len(' is not set')], 'n'
+    return None, None
+
+
+@functools.lru_cache(maxsize=None)
+def read_config_syms(config_file, mtime_ns):  # noqa: ARG001
+    """
+    Parses a configuration file into a dictionary of symbols to values.
+    Parameters:
+        config_file (Path): Configuration file to parse.
+        mtime_ns (int): Modification time of config_file, so that the cache
+                        is invalidated when the file changes.
+    Returns:
+        A dictionary of symbols (including 'CONFIG_') to values.
+    """
+    config_syms = {}
+    for line in config_file.read_text(encoding='utf-8').splitlines():
+        sym, val = parse_config_line(line)
+        if sym:
+            config_syms[sym] = val
+    return config_syms
+
+
+def remove_folder_async(folder):
+    """
+    Moves a folder out of the way and removes it in the background, so that
+    the path can be reused immediately. Call wait_for_folder_removals() before
+    exiting to make sure that the removals have finished.
+    Parameters:
+        folder (Path): Folder to remove.
+    Returns:
+        The thread removing the folder.
+    """
+    # Pick up folders left behind by a previous run that was interrupted but
+    # not the ones from this run, which may still be in the middle of being
+    # removed by another thread.
+    stale_folders = [
+        item for item in folder.parent.glob('.*.stale-*')
+        if f".stale-{STALE_FOLDER_RUN_ID}-" not in item.name
+    ]
+    stale_folder = folder.with_name(
+        f".{folder.name}.stale-{STALE_FOLDER_RUN_ID}-{uuid.uuid4().hex}")
+    folder.rename(stale_folder)
+    stale_folders.append(stale_folder)
+    # A daemon thread so that an interrupted run can exit right away
+    thread = threading.Thread(target=remove_folders, args=(stale_folders, ), daemon=True)
+    thread.start()
+    FOLDER_REMOVAL_THREADS.append(thread)
+    return thread
+
+
+def remove_folders(folders):
+    """
+    Removes several folders, ignoring any errors, such as a folder that is
+    already being removed elsewhere.
+    Parameters:
+        folders (list): Folders to remove.
+    """
+    for folder in folders:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
 def run(*args, **kwargs):
     kwargs.setdefault('check', True)
 
@@ -91,7 +276,7 @@ def run(*args, **kwargs):
         show_cmd(*args)
 
     if env := kwargs.pop('env', None):
-        kwargs['env'] = os.environ | copy.deepcopy(env)
+        kwargs['env'] = {**os.environ, **env}
 
     try:
         # This function defaults check=True so if check=False here, it is explicit
@@ -101,6 +286,8 @@ def run(*args, **kwargs):
         if kwargs.get('capture_output'):
             print(err.stdout)
             print(err.stderr)
+        elif kwargs.get('stderr') == subprocess.PIPE:
+            print(err.stderr)
         raise err
 
 
@@ -110,3 +297,17 @@ def run_check_rc_zero(*args, **kwargs):
 
 def show_cmd(cmd):
     print(f"\n{cmd_str(cmd)}")
+
+
+# PATH is finalized before any lookups happen so the results can be cached
+@functools.lru_cache(maxsize=None)
+def wait_for_folder_removals():
+    """
+    Waits for all folders passed to remove_folder_async() to be removed.
+    """
+    for thread in FOLDER_REMOVAL_THREADS:
+        thread.join()
+
+
+def which(cmd):
+    return shutil.which(cmd)
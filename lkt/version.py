@@ -1,17 +1,20 @@
 #!/usr/bin/env python3
 
-from functools import total_ordering
 import os
 from pathlib import Path
 import re
-import shutil
 
 import lkt.utils
 
 DEFAULT_VERSION = (0, 0, 0)
+LINUX_VERSION_RE = re.compile(
+    r"^VERSION[ \t]*=[ \t]*(\d+)\nPATCHLEVEL[ \t]*=[ \t]*(\d+)\nSUBLEVEL[ \t]*=[ \t]*(\d+)$",
+    flags=re.M)
+VERSION_CACHE = {}
+VERSION_RE = re.compile(r"(\d+)\.(\d+)(?:\.(\d+))?")
+QEMU_VERSION_RE = re.compile(f"version {VERSION_RE.pattern}")
 
 
-@total_ordering
 class Version:
 
     def __init__(self, *args, **kwargs):
@@ -19,7 +22,12 @@ class Version:
         if len(args) > 0:
             self._key = tuple(args)
         else:
-            self._key = self._gen_key(**kwargs)
+            # Generating a version usually involves running a tool and the
+            # result does not change during a run, so only do it once.
+            cache_key = (type(self), tuple(sorted(kwargs.items())))
+            if (key := VERSION_CACHE.get(cache_key)) is None:
+                key = VERSION_CACHE[cache_key] = self._gen_key(**kwargs)
+            self._key = key
 
     def _is_valid_operand(self, other):
         return isinstance(other, (tuple, Version))
@@ -41,6 +49,21 @@ class Version:
             return NotImplemented
         return self._key == self._get_key(other)
 
+    def __ge__(self, other):
+        if not self._is_valid_operand(other):
+            return NotImplemented
+        return self._key >= self._get_key(other)
+
+    def __gt__(self, other):
+        if not self._is_valid_operand(other):
+            return NotImplemented
+        return self._key > self._get_key(other)
+
+    def __le__(self, other):
+        if not self._is_valid_operand(other):
+            return NotImplemented
+        return self._key <= self._get_key(other)
+
     def __lt__(self, other):
         if not self._is_valid_operand(other):
             return NotImplemented
@@ -56,23 +79,22 @@ class Version:
 class BinutilsVersion(Version):
 
     def _gen_ver_iter(self, binary='as'):
-        if not shutil.which(binary):
+        if not lkt.utils.which(binary):
             return DEFAULT_VERSION
 
         as_output = lkt.utils.chronic([binary, '--version']).stdout.splitlines()[0]
-        # "GNU assembler (GNU Binutils) 2.39.50.20221024" -> "2.39.50.20221024" -> ['2', '39', '50']
-        # "GNU assembler version 2.39-3.fc38" -> "2.39-3.fc38" -> ['2.39'] -> ['2', '39'] -> ['2', '39', '0']
-        as_iter = as_output.split(' ')[-1].split('-')[0].split('.')[0:3]
-        if len(as_iter) == 2:
-            as_iter.append('0')
+        # "GNU assembler (GNU Binutils) 2.39.50.20221024" -> "2.39.50.20221024" -> ('2', '39', '50')
+        # "GNU assembler version 2.39-3.fc38" -> "2.39-3.fc38" -> ('2', '39', '0')
+        if not (match := VERSION_RE.match(as_output.split(' ')[-1])):
+            raise RuntimeError('Could not find binutils version?')
 
-        return as_iter
+        return match.groups(default='0')
 
 
 class ClangVersion(Version):
 
     def _gen_ver_iter(self, binary='clang'):
-        if not shutil.which(binary):
+        if not lkt.utils.which(binary):
             return DEFAULT_VERSION
 
         clang_cmd = [binary, '-E', '-P', '-x', 'c', '-']
@@ -91,8 +113,18 @@ class LinuxVersion(Version):
             raise RuntimeError(
                 f"Provided kernel source ('{folder}') does not look like a Linux kernel tree?")
 
+        # Parse the version variables at the top of the Makefile directly, as
+        # running 'make kernelversion' has to parse the whole build system.
+        # Fall back to it if the Makefile does not look as expected.
+        with Path(folder, 'Makefile').open(encoding='utf-8') as file:
+            makefile_head = file.read(1024)
+        if match := LINUX_VERSION_RE.search(makefile_head):
+            return match.groups()
+
         output = lkt.utils.chronic(['make', '-s', 'kernelversion'], cwd=folder).stdout.strip()
-        return output.split('-', 1)[0].split('.')
+        if not (match := VERSION_RE.match(output)):
+            raise RuntimeError(f"Could not parse kernel version ('{output}')?")
+        return match.groups(default='0')
 
 
 class MinToolVersion(Version):
@@ -118,11 +150,11 @@ class MinToolVersion(Version):
 class QemuVersion(Version):
 
     def _gen_ver_iter(self, arch='x86_64'):
-        if not shutil.which(binary := f"qemu-system-{arch}"):
+        if not lkt.utils.which(binary := f"qemu-system-{arch}"):
             return DEFAULT_VERSION
 
         qemu_ver = lkt.utils.chronic([binary, '--version']).stdout.splitlines()[0]
-        if not (match := re.search(r'version (\d+\.\d+.\d+)', qemu_ver)):
+        if not (match := QEMU_VERSION_RE.search(qemu_ver)):
             raise RuntimeError('Could not find QEMU version?')
 
-        return match.groups()[0].split('.')
+        return match.groups(default='0')
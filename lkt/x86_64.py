@@ -103,17 +103,15 @@ class X8664LKTRunner(lkt.runner.LKTRunner):
             ('fedora', KERNEL_ARCH),
             ('opensuse', KERNEL_ARCH),
         ]
+        needs_gnu_objcopy = 'aaeed6ecc1253' not in self.lsm.commits
+        gnu_objcopy = f"{self.make_vars.get('CROSS_COMPILE', '')}objcopy"
         for distro, config_name in configs:
             runner = X8664LLVMKernelRunner()
             runner.bootable = True
             runner.configs = [Path(self.folders.configs, distro, f"{config_name}.config")]
             has_x32 = lkt.utils.is_set(self.folders.source, runner.configs[0], 'X86_X32_ABI')
-            needs_gnu_objcopy = 'aaeed6ecc1253' not in self.lsm.commits
             if has_x32 and needs_gnu_objcopy:
-                if 'CROSS_COMPILE' in self.make_vars:
-                    runner.make_vars['OBJCOPY'] = f"{self.make_vars['CROSS_COMPILE']}objcopy"
-                else:
-                    runner.make_vars['OBJCOPY'] = 'objcopy'
+                runner.make_vars['OBJCOPY'] = gnu_objcopy
             if self.lsm.version < (5, 7, 0):
                 for sym in ('STM', 'TEST_MEMCAT_P'):
                     if lkt.utils.is_set(self.folders.source, runner.configs[0], sym):